@@ -9,10 +9,12 @@ from dash import dcc, html, Input, Output, State, callback, ctx
 import plotly.graph_objects as go
 import pandas as pd
 import logging
+import re
 from datetime import datetime, timedelta
 import json
 import os
 import secrets
+import traceback
 import requests
 from flask import request, redirect, Response
 import plotly.io as pio
@@ -32,6 +34,12 @@ if logger is None:
 is_authenticated = False
 company_info = None
 
+# Leading account number of a P&L row name, e.g. "6205.01 Dental" -> "6205"
+ACCOUNT_NUMBER_PATTERN = re.compile(r'^(\d{4,5})(\.\d{1,2})?\s+')
+
+# Drops thousands separators and dollar signs from report amounts in one pass
+CURRENCY_STRIP_TABLE = str.maketrans('', '', ',$')
+
 # Initialize Dash app
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
 app.title = "QBO Sankey Dashboard"
@@ -425,9 +433,7 @@ def export_sankey_as_png(figure, filename="sankey_diagram.png"):
         
     except Exception as e:
         logger.error(f"Error exporting PNG: {e}")
-        logger.error(f"Error type: {type(e)}")
-        import traceback
-        logger.error(f"Traceback: {traceback.format_exc()}")
+        logger.error(f"Error type: {type(e)}", exc_info=True)
         return None
 
 # Callback to handle Connect to QuickBooks button
@@ -766,7 +772,6 @@ def debug_pl_structure():
         
     except Exception as e:
         logger.error(f"Error in debug endpoint: {e}")
-        import traceback
         return {
             "error": str(e),
             "traceback": traceback.format_exc()
@@ -779,7 +784,6 @@ def debug_account_analysis():
     from dashboard.data_fetcher import QBODataFetcher
     from datetime import datetime, timedelta
     import json
-    import re
     
     try:
         credential_manager = CredentialManager()
@@ -818,13 +822,8 @@ def debug_account_analysis():
                 return
             
             if 'Rows' in data:
-                rows_data = data['Rows']
-                if isinstance(rows_data, dict) and 'Row' in rows_data:
-                    rows = rows_data['Row']
-                elif isinstance(rows_data, list):
-                    rows = rows_data
-                else:
-                    return
+                # Handles both the {'Row': [...]} and plain-list shapes in one place
+                rows = data_fetcher._extract_rows(data['Rows'])
                 
                 for row in rows:
                     if not isinstance(row, dict):
@@ -838,7 +837,7 @@ def debug_account_analysis():
                         col_data = row['Header'].get('ColData', [])
                         if len(col_data) >= 2:
                             name = col_data[0].get('value', '')
-                            amount_str = col_data[1].get('value', '0').replace(',', '').replace('$', '')
+                            amount_str = col_data[1].get('value', '0').translate(CURRENCY_STRIP_TABLE)
                             try:
                                 amount = float(amount_str)
                             except:
@@ -847,7 +846,7 @@ def debug_account_analysis():
                         col_data = row['ColData']
                         if len(col_data) >= 2:
                             name = col_data[0].get('value', '')
-                            amount_str = col_data[1].get('value', '0').replace(',', '').replace('$', '')
+                            amount_str = col_data[1].get('value', '0').translate(CURRENCY_STRIP_TABLE)
                             try:
                                 amount = float(amount_str)
                             except:
@@ -855,7 +854,7 @@ def debug_account_analysis():
                     
                     if name:
                         # Extract account number
-                        match = re.match(r'^(\d{4,5})(\.\d{1,2})?\s+', name)
+                        match = ACCOUNT_NUMBER_PATTERN.match(name)
                         account_num = match.group(1) if match else None
                         
                         all_accounts.append({
@@ -911,7 +910,6 @@ def debug_account_analysis():
         
     except Exception as e:
         logger.error(f"Error in account analysis: {e}")
-        import traceback
         return {
             "error": str(e),
             "traceback": traceback.format_exc()
@@ -1038,7 +1036,6 @@ def test_hierarchy_parser():
         
     except Exception as e:
         logger.error(f"Error testing parser: {e}")
-        import traceback
         return jsonify({
             "error": str(e),
             "traceback": traceback.format_exc()
@@ -1154,7 +1151,7 @@ def update_sankey_chart(apply_clicks, ytd_clicks, last30_clicks, last90_clicks,
     if not ctx.triggered:
         return dash.no_update
     
-    trigger_id = ctx.triggered[0]['prop_id'].split('.')[0]
+    trigger_id = ctx.triggered[0]['prop_id'].partition('.')[0]
     
     # Handle different date range buttons
     if trigger_id == 'ytd-btn' and ytd_clicks:
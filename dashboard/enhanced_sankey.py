@@ -2,15 +2,105 @@
 Enhanced Sankey diagram with zoom, pan, and dynamic sizing
 """
 
-import plotly.graph_objects as go
 import logging
 import re
 import math
+import heapq
+import threading
+from collections import defaultdict
+from functools import lru_cache
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Leading 3-4 digit account number, e.g. "6001 Some Expense" -> "6001"
+_ACCOUNT_PREFIX_RE = re.compile(r'^(\d{3,4})')
+
+# Inclusive account number ranges rolled up by group_expenses_by_account_number
+_EXPENSE_GROUP_RANGES = (
+    ('Fringe & Benefits', 6000, 6300),
+    ('Facility Expenses', 6500, 6999),
+    ('OH Other Expenses', 7000, 7500),
+    ('GA Other Expenses', 8000, 8499),
+)
+
+# Every account number in those ranges mapped to its group, so grouping is one dict lookup
+_EXPENSE_GROUP_BY_NUMBER = {
+    account_num: group_name
+    for group_name, min_num, max_num in _EXPENSE_GROUP_RANGES
+    for account_num in range(min_num, max_num + 1)
+}
+
+# Node colors shared by the enhanced and sample diagrams
+_INCOME_COLOR = "#27ae60"  # Green for income
+_TOTAL_REVENUE_COLOR = "#3498db"  # Blue for total revenue
+_PRIMARY_COLOR = "#e67e22"  # Orange for primary categories
+_EXPENSE_COLOR = "#e74c3c"  # Red for expenses
+_TERTIARY_PARENT_COLOR = "#9b59b6"  # Purple for secondary expenses with tertiaries
+_NET_INCOME_COLOR = "#f39c12"  # Gold for final result
+
+# "<name><br>$<amount>" node label, e.g. "Rent<br>$12,000"
+_node_label = "{}<br>${:,.0f}".format
+
+# Tertiary items listed individually in a secondary node's hover breakdown; the rest are summarized
+_TERTIARY_HOVER_ITEMS = 10
+
+# Built figures keyed by their chart inputs and displayed date range. Each dashboard
+# callback rebuilds the same (usually YTD) chart from identical data; figures are only
+# serialized by Dash after being built, so a cached one can be handed out again.
+# Oldest entries are dropped past the cap.
+_FIGURE_CACHE: Dict[Any, Any] = {}
+_FIGURE_CACHE_MAX_ENTRIES = 64
+# Guards _FIGURE_CACHE across concurrent dashboard callbacks; figures are built outside it
+_FIGURE_CACHE_LOCK = threading.Lock()
+
+def _freeze(value):
+    """Hashable snapshot of nested chart inputs; keeps dict order, which sets node order"""
+    if isinstance(value, dict):
+        return tuple((key, _freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _cached_figure(key, build):
+    """Return the cached figure for key, building (and caching) it on a miss"""
+    with _FIGURE_CACHE_LOCK:
+        fig = _FIGURE_CACHE.get(key)
+    if fig is not None:
+        logger.debug("Reusing cached Sankey figure")
+        return fig
+    
+    fig = build()
+    if fig is not None:
+        with _FIGURE_CACHE_LOCK:
+            _FIGURE_CACHE[key] = fig
+            while len(_FIGURE_CACHE) > _FIGURE_CACHE_MAX_ENTRIES:
+                del _FIGURE_CACHE[next(iter(_FIGURE_CACHE))]
+    return fig
+
+def _default_date_range(start_date, end_date):
+    """Fill in a Year to Date range for missing dates"""
+    if end_date is None:
+        end_date = datetime.now()
+    if start_date is None:
+        # Year to Date (January 1st of current year)
+        start_date = datetime(end_date.year, 1, 1)
+    return start_date, end_date
+
+@lru_cache(maxsize=1024)
+def _leading_account_number(expense_name: str) -> Optional[int]:
+    """
+    Get the leading 3-4 digit account number of an expense name ("6001 Some Expense" -> 6001).
+    The usual 4-digit prefix is checked with a slice; only other names go through the regex.
+    Cached because the same chart of accounts is regrouped on every chart refresh.
+    """
+    head = expense_name[:4]
+    if len(head) == 4 and head.isdecimal():
+        return int(head)
+    match = _ACCOUNT_PREFIX_RE.match(expense_name)
+    return int(match.group(1)) if match else None
+
 def group_expenses_by_account_number(expense_categories: Dict[str, float]) -> Dict[str, float]:
     """
     Group expenses based on account number ranges and dollar amounts.
@@ -30,54 +120,42 @@ def group_expenses_by_account_number(expense_categories: Dict[str, float]) -> Di
     Returns:
         Dictionary with grouped and individual expenses
     """
-    grouped_expenses = {}
-    group_ranges = {
-        'Fringe & Benefits': (6000, 6300),
-        'Facility Expenses': (6500, 6999),
-        'OH Other Expenses': (7000, 7500),
-        'GA Other Expenses': (8000, 8499)
-    }
+    grouped_expenses = defaultdict(float)
     threshold = 10000  # Group if less than this amount
     
     logger.info(f"Grouping expenses: {len(expense_categories)} expenses before grouping")
     
     for expense_name, amount in expense_categories.items():
-        # Debug logging for account 8500 specifically
-        if '8500' in expense_name or 'GA Travel' in expense_name:
+        # Debug logging for account 8500 specifically; the check is reused below
+        is_ga_travel = '8500' in expense_name or 'GA Travel' in expense_name
+        if is_ga_travel:
             logger.info(f"🔍 Processing expense: '{expense_name}' = ${amount:,.2f}")
         
-        # Extract account number from start of name (e.g., "6001 Some Expense" -> 6001)
-        match = re.match(r'^(\d{3,4})', expense_name)
+        # Extract account number from start of name (e.g., "6001 Some Expense" -> 6001);
+        # only amounts under the threshold can be grouped, so skip the lookup for the rest
+        account_num = _leading_account_number(expense_name) if amount < threshold else None
         
-        if match and amount < threshold:
-            account_num = int(match.group(1))
-            
+        if account_num is not None:
             # Debug logging for account 8500
             if account_num == 8500:
                 logger.info(f"🔍 Account 8500 found: amount=${amount:,.2f}, threshold=${threshold:,.2f}")
             
             # Check which group this account belongs to
-            grouped = False
-            for group_name, (min_num, max_num) in group_ranges.items():
-                if min_num <= account_num <= max_num:
-                    if group_name in grouped_expenses:
-                        grouped_expenses[group_name] += amount
-                    else:
-                        grouped_expenses[group_name] = amount
-                    grouped = True
-                    logger.debug(f"Grouped '{expense_name}' (${amount:,.2f}) into '{group_name}'")
-                    break
-            
-            # If not in any group range, keep as individual
-            if not grouped:
+            group_name = _EXPENSE_GROUP_BY_NUMBER.get(account_num)
+            if group_name is not None:
+                grouped_expenses[group_name] += amount
+                logger.debug(f"Grouped '{expense_name}' (${amount:,.2f}) into '{group_name}'")
+            else:
+                # If not in any group range, keep as individual
                 grouped_expenses[expense_name] = amount
                 if account_num == 8500:
                     logger.info(f"✅ Account 8500 kept as individual expense: '{expense_name}' = ${amount:,.2f}")
         else:
             # Amount >= threshold OR no account number found - keep as individual
             grouped_expenses[expense_name] = amount
-            if '8500' in expense_name or 'GA Travel' in expense_name:
-                reason = "amount >= threshold" if match and amount >= threshold else "no account number found"
+            if is_ga_travel:
+                has_account_num = amount >= threshold and _leading_account_number(expense_name) is not None
+                reason = "amount >= threshold" if has_account_num else "no account number found"
                 logger.info(f"✅ Account 8500 kept as individual (reason: {reason}): '{expense_name}' = ${amount:,.2f}")
     
     logger.info(f"After grouping: {len(grouped_expenses)} expenses remain")
@@ -89,19 +167,97 @@ def group_expenses_by_account_number(expense_categories: Dict[str, float]) -> Di
     else:
         logger.warning(f"⚠️ Account 8500 NOT found in final grouped expenses")
     
-    return grouped_expenses
+    return dict(grouped_expenses)
+
+def _top_tertiaries(tertiaries, limit):
+    """
+    Largest `limit` tertiary items (largest first) for a hover breakdown, plus the
+    count and total of the remaining items, without sorting the whole breakdown
+    """
+    if len(tertiaries) <= limit:
+        return sorted(tertiaries.items(), key=lambda x: x[1], reverse=True), 0, 0
+    top_items = heapq.nlargest(limit, tertiaries.items(), key=lambda x: x[1])
+    top_names = {name for name, _ in top_items}
+    remaining = [amount for name, amount in tertiaries.items() if name not in top_names]
+    return top_items, len(remaining), sum(remaining)
+
+def _labelled_amounts(items):
+    """Node labels, amounts and their total for (name, amount) items, in a single pass"""
+    labels = []
+    amounts = []
+    total = 0
+    for name, amount in items:
+        total += amount
+        labels.append(_node_label(name, amount))
+        amounts.append(amount)
+    return labels, amounts, total
+
+def _sankey_figure(sankey, layout):
+    """
+    Plain-dict figure from a Sankey trace dict and layout dict. dcc.Graph and
+    plotly.io.to_image take it as-is, so no go.Figure (and its per-attribute
+    validation) is built for each chart.
+    """
+    return dict(data=[sankey], layout=layout)
+
+def _sankey_title_text(income_sources, start_date, end_date, total_revenue, total_expenses, net_income):
+    """Title with the financial summary and date range, shared by the enhanced and sample diagrams"""
+    # Format date range
+    date_range = f"{start_date.strftime('%B %d, %Y')} - {end_date.strftime('%B %d, %Y')}"
+    
+    # Check if income is by project or by account
+    income_source_label = "Project Revenue" if len(income_sources) > 0 else "Account Revenue"
+    
+    return f"Financial Flow Analysis - {income_source_label} ({date_range})<br><sub>Total Revenue: ${total_revenue:,.0f} | Total Expenses: ${total_expenses:,.0f} | Net Income: ${net_income:,.0f}</sub>"
+
+def _sankey_layout(title_text, font_size, height, margin, **extra_layout):
+    """Shared title, sizing and zoom/pan layout plus any diagram-specific settings, as a plain dict"""
+    return dict(
+        # Nested title/font keys: the underscore shorthand (title_text, font_size, ...)
+        # is only expanded by go.Figure, plotly.js ignores it in a plain dict
+        title=dict(text=title_text, x=0.5, font=dict(size=20)),  # Centered title
+        font=dict(size=font_size),
+        height=height,
+        margin=margin,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        # Enable zooming and panning
+        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
+        # Make it responsive
+        autosize=True,  # Enable responsive sizing
+        # Enable zoom and pan
+        dragmode='zoom',
+        # Add zoom controls
+        showlegend=False,
+        # Add selection mode
+        selectdirection='d',  # 'd' for diagonal selection
+        # Enable hover
+        hovermode='closest',
+        **extra_layout
+    )
 
 def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=None):
-    """Create an enhanced Sankey diagram with zoom, pan, and dynamic sizing"""
-    from datetime import datetime, timedelta
+    """
+    Create an enhanced Sankey diagram with zoom, pan, and dynamic sizing
     
+    Figures are cached on the income/expense inputs and the displayed (day) date range.
+    """
     # Set default date range (Year to Date if not provided)
-    if end_date is None:
-        end_date = datetime.now()
-    if start_date is None:
-        # Year to Date (January 1st of current year)
-        start_date = datetime(end_date.year, 1, 1)
-    
+    start_date, end_date = _default_date_range(start_date, end_date)
+    
+    key = (
+        'enhanced',
+        _freeze(financial_data.get('income', {})),
+        _freeze(financial_data.get('expense_hierarchy', {})),
+        _freeze(financial_data.get('expenses', {})),
+        start_date.strftime('%Y-%m-%d'),
+        end_date.strftime('%Y-%m-%d'),
+    )
+    return _cached_figure(key, lambda: _build_enhanced_sankey_diagram(financial_data, start_date, end_date))
+
+def _build_enhanced_sankey_diagram(financial_data, start_date, end_date):
+    """Build the enhanced Sankey figure for create_enhanced_sankey_diagram"""
     # Extract data from financial_data dictionary
     income_sources = financial_data.get('income', {})
     expense_hierarchy = financial_data.get('expense_hierarchy', {})
@@ -121,40 +277,34 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
     if not income_sources:
         income_sources = {"No Income Data": 0}
     
-    # Calculate totals
-    total_revenue = sum(income_sources.values())
+    # Calculate totals; the income labels and link values come from the same pass
+    # over the income sources (left column, x=0)
+    income_labels, income_values, total_revenue = _labelled_amounts(income_sources.items())
     if expense_hierarchy:
         total_expenses = sum(prim_data.get('total', 0) for prim_data in expense_hierarchy.values())
     else:
         total_expenses = sum(expense_categories.values())
     adjusted_gross_income = total_revenue - total_expenses
     
-    # Create nodes with dollar amounts as labels
-    node_labels = []
-    node_colors = []
-    node_x_positions = []  # X positions for hierarchical layout
+    # Create nodes with dollar amounts as labels, starting with the income sources
+    income_count = len(income_values)
+    node_labels = income_labels
+    node_colors = [_INCOME_COLOR] * income_count
+    node_x_positions = [0.0] * income_count  # X positions for hierarchical layout
     
     # Store tertiary data for hover tooltips (map node index to tertiary data)
-    node_tertiary_data = {}  # Map node index -> list of (tertiary_name, tertiary_amount) tuples
-    
-    # Income sources (left column, x=0)
-    income_indices = {}
-    for i, (source, amount) in enumerate(income_sources.items()):
-        node_labels.append(f"{source}<br>${amount:,.0f}")
-        node_colors.append("#27ae60")  # Green for income
-        node_x_positions.append(0.0)
-        income_indices[source] = i
+    node_tertiary_data = {}  # Map node index -> (top (tertiary_name, tertiary_amount) tuples, remaining count, remaining total)
     
     # Total revenue (center column, x=0.33)
-    total_revenue_idx = len(income_sources)
+    total_revenue_idx = income_count
     net_income_text = f"<br><br><b>Net Income:</b> ${adjusted_gross_income:,.0f}" if adjusted_gross_income != 0 else ""
     node_labels.append(f"<b>Total Revenue</b><br>${total_revenue:,.0f}{net_income_text}")
-    node_colors.append("#3498db")  # Blue for total revenue
+    node_colors.append(_TOTAL_REVENUE_COLOR)
     node_x_positions.append(0.33)
     
     # Process hierarchical expenses
     primary_indices = {}  # Map primary names to node indices
-    secondary_indices = {}  # Map (primary_name, secondary_name) to node indices
+    secondary_nodes = {}  # Map primary name -> [(node index, secondary name, amount)] in creation order
     
     if expense_hierarchy:
         logger.info(f"Building hierarchical Sankey structure with {len(expense_hierarchy)} primaries")
@@ -167,8 +317,8 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
                 primary_amount = primary_data.get('total', 0)
                 if primary_amount > 0:
                     idx = len(node_labels)
-                    node_labels.append(f"{primary_name}<br>${primary_amount:,.0f}")
-                    node_colors.append("#e67e22")  # Orange for primary categories
+                    node_labels.append(_node_label(primary_name, primary_amount))
+                    node_colors.append(_PRIMARY_COLOR)
                     node_x_positions.append(0.67)
                     primary_indices[primary_name] = idx
                     logger.info(f"  Created primary node: {primary_name} (idx={idx})")
@@ -184,44 +334,42 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
                     sec_amount = sec_data.get('total', 0)
                     if sec_amount > 0:
                         idx = len(node_labels)
-                        node_labels.append(f"{sec_name}<br>${sec_amount:,.0f}")
+                        node_labels.append(_node_label(sec_name, sec_amount))
                         node_x_positions.append(1.0)
                         
                         # Store tertiary data for this node if it exists
                         tertiaries = sec_data.get('tertiary', {})
                         if tertiaries:
-                            # Store tertiary data as list of tuples for hover tooltip
-                            tertiary_list = sorted(tertiaries.items(), key=lambda x: x[1], reverse=True)
-                            node_tertiary_data[idx] = tertiary_list
+                            # Store the top tertiaries (and a summary of the rest) for the hover tooltip
+                            node_tertiary_data[idx] = _top_tertiaries(tertiaries, _TERTIARY_HOVER_ITEMS)
                             # Color code: Purple/magenta for nodes with tertiary breakdown
-                            node_colors.append("#9b59b6")  # Purple for secondary expenses with tertiaries
+                            node_colors.append(_TERTIARY_PARENT_COLOR)
                             logger.info(f"    Created secondary node with {len(tertiaries)} tertiaries (purple color): {sec_name} (idx={idx})")
                         else:
                             # Color code: Red for nodes without tertiaries
-                            node_colors.append("#e74c3c")  # Red for secondary expenses without tertiaries
+                            node_colors.append(_EXPENSE_COLOR)  # Red for secondary expenses without tertiaries
                             logger.info(f"    Created secondary node (red color): {sec_name} (idx={idx})")
                         
-                        secondary_indices[(primary_name, sec_name)] = idx
+                        secondary_nodes.setdefault(primary_name, []).append((idx, sec_name, sec_amount))
             else:
                 # Primary has no secondaries - create direct expense node (x=1.0)
                 primary_amount = primary_data.get('total', 0)
                 if primary_amount > 0:
                     idx = len(node_labels)
-                    node_labels.append(f"{primary_name}<br>${primary_amount:,.0f}")
-                    node_colors.append("#e74c3c")  # Red for expenses
+                    node_labels.append(_node_label(primary_name, primary_amount))
+                    node_colors.append(_EXPENSE_COLOR)
                     node_x_positions.append(1.0)
                     primary_indices[primary_name] = idx  # Direct link from Total Revenue
                     logger.info(f"  Created direct expense node: {primary_name} (idx={idx})")
     else:
         # Fallback to flat structure
         logger.info("Using flat expense structure (no hierarchy available)")
-        expense_items = list(expense_categories.items())
-        expense_items = sorted(expense_items, key=lambda x: x[1], reverse=True)
+        expense_items = sorted(expense_categories.items(), key=lambda x: x[1], reverse=True)
         
         for expense, amount in expense_items:
             idx = len(node_labels)
-            node_labels.append(f"{expense}<br>${amount:,.0f}")
-            node_colors.append("#e74c3c")  # Red for expenses
+            node_labels.append(_node_label(expense, amount))
+            node_colors.append(_EXPENSE_COLOR)
             node_x_positions.append(1.0)
             primary_indices[expense] = idx  # Use same dict for flat structure
     
@@ -229,9 +377,10 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
     
     # Create links - use actual dollar amounts for proper node height alignment
     # Plotly Sankey uses link values to calculate node heights, so we need actual amounts
-    source_indices = []
-    target_indices = []
-    values = []
+    # Links from income sources to total revenue come first, one per income node
+    source_indices = list(range(income_count))
+    target_indices = [total_revenue_idx] * income_count
+    values = income_values  # Use actual amounts, not scaled
     
     # Threshold: values below $20k will appear as thin lines (for visual scaling)
     threshold = 20000
@@ -249,13 +398,6 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
             log_factor = math.log10(max(val, 1) / threshold)
             return min_log_value + (log_factor * threshold * 0.15)  # Reduced from 0.3 to 0.15
     
-    # Links from income sources to total revenue
-    # Use actual amounts so node heights match properly
-    for i, (source, amount) in enumerate(income_sources.items()):
-        source_indices.append(i)
-        target_indices.append(total_revenue_idx)
-        values.append(amount)  # Use actual amount, not scaled
-    
     # Links for hierarchical expense structure
     if expense_hierarchy:
         for primary_name, primary_data in expense_hierarchy.items():
@@ -273,16 +415,13 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
                         values.append(primary_amount)  # Use actual amount for proper alignment
                         logger.info(f"  Link: Total Revenue → {primary_name} (${primary_amount:,.0f})")
                         
-                        # Then link Primary → each Secondary
+                        # Then link Primary → each Secondary node created for it
                         # Use actual amounts so secondary node heights match
-                        for sec_name, sec_data in secondaries.items():
-                            sec_amount = sec_data.get('total', 0)
-                            if sec_amount > 0 and (primary_name, sec_name) in secondary_indices:
-                                sec_idx = secondary_indices[(primary_name, sec_name)]
-                                source_indices.append(primary_idx)
-                                target_indices.append(sec_idx)
-                                values.append(sec_amount)  # Use actual amount, not scaled
-                                logger.info(f"    Link: {primary_name} → {sec_name} (${sec_amount:,.0f})")
+                        for sec_idx, sec_name, sec_amount in secondary_nodes.get(primary_name, ()):
+                            source_indices.append(primary_idx)
+                            target_indices.append(sec_idx)
+                            values.append(sec_amount)  # Use actual amount, not scaled
+                            logger.info(f"    Link: {primary_name} → {sec_name} (${sec_amount:,.0f})")
                 else:
                     # Primary has no secondaries - link directly from Total Revenue
                     if primary_name in primary_indices:
@@ -292,15 +431,10 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
                         values.append(primary_amount)  # Use actual amount for proper alignment
                         logger.info(f"  Link: Total Revenue → {primary_name} (direct, ${primary_amount:,.0f})")
     else:
-        # Fallback to flat structure
-        expense_items = list(expense_categories.items())
-        expense_items = sorted(expense_items, key=lambda x: x[1], reverse=True)
-        for expense, amount in expense_items:
-            if expense in primary_indices:
-                expense_idx = primary_indices[expense]
-                source_indices.append(total_revenue_idx)
-                target_indices.append(expense_idx)
-                values.append(amount)  # Use actual amount for proper alignment
+        # Fallback to flat structure: every sorted expense item got a node above
+        source_indices.extend([total_revenue_idx] * len(expense_items))
+        target_indices.extend(primary_indices[expense] for expense, _ in expense_items)
+        values.extend(amount for _, amount in expense_items)  # Use actual amounts for proper alignment
     
     # No link to Net Income - it's displayed as text below Total Revenue
     
@@ -312,26 +446,23 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
     # Plotly Sankey supports customdata which can be referenced in hovertemplate
     # All nodes get customdata - nodes with tertiaries get breakdown, others get their label
     logger.info(f"Creating hover data for {len(node_labels)} nodes")
-    logger.info(f"Nodes with tertiary data: {list(node_tertiary_data.keys())}")
+    logger.info("Nodes with tertiary data: %s", node_tertiary_data.keys())
     
     node_customdata = []  # Custom data array for hover tooltips
     
     for i in range(len(node_labels)):
         if i in node_tertiary_data:
             # This node has tertiary data - create custom data with breakdown
-            tertiaries = node_tertiary_data[i]
-            logger.info(f"  Node {i} ({node_labels[i].split('<br>')[0]}): Creating custom hover data with {len(tertiaries)} tertiaries")
+            tertiaries, remaining_count, remaining_total = node_tertiary_data[i]
+            logger.info(f"  Node {i} ({node_labels[i].partition('<br>')[0]}): Creating custom hover data with {len(tertiaries) + remaining_count} tertiaries")
             
             # Format tertiary breakdown (show top 10, then summarize if more)
-            max_items = 10
             tertiary_lines = []
-            for tert_name, tert_amount in tertiaries[:max_items]:
+            for tert_name, tert_amount in tertiaries:
                 tertiary_lines.append(f"• {tert_name}: ${tert_amount:,.0f}")
             
             # If more than 10, add summary
-            if len(tertiaries) > max_items:
-                remaining_count = len(tertiaries) - max_items
-                remaining_total = sum(amount for _, amount in tertiaries[max_items:])
+            if remaining_count:
                 tertiary_lines.append(f"...and {remaining_count} more item{'s' if remaining_count > 1 else ''}: ${remaining_total:,.0f}")
             
             # Create custom data with tertiary breakdown
@@ -356,8 +487,9 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
     logger.info(f"Custom hover data created: {custom_count} with tertiary breakdown, {len(node_labels) - custom_count} with label only")
     logger.info(f"Using hovertemplate: {hovertemplate}")
     
-    # Create the enhanced Sankey diagram
-    fig = go.Figure(data=[go.Sankey(
+    # Create the enhanced Sankey trace (y is left unset so nodes auto-arrange vertically)
+    sankey = dict(
+        type = 'sankey',
         node = dict(
             pad = 25,  # Reduced padding for tighter layout
             thickness = 35,  # Increased thickness for all nodes (was 22) - makes center node more prominent
@@ -365,7 +497,6 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
             label = node_labels,
             color = node_colors,
             x = node_x_positions if node_x_positions else [0.15, 0.5, 0.85],  # Use hierarchical positions if available
-            y = None,  # Auto-arrange vertically
             customdata = node_customdata,  # Custom data for hover (breakdown for nodes with tertiaries, label for others)
             hovertemplate = hovertemplate  # Single template that uses customdata
         ),
@@ -375,53 +506,17 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
             value = values,  # Logarithmically scaled values for thickness
             color = "rgba(0,0,0,0.2)"  # Subtle link colors
         )
-    )])
-    
-    # Format date range
-    date_range = f"{start_date.strftime('%B %d, %Y')} - {end_date.strftime('%B %d, %Y')}"
+    )
     
     # Add title with financial summary and date range
-    # Check if income is by project or by account
-    income_source_label = "Project Revenue" if len(income_sources) > 0 else "Account Revenue"
-    
-    title_text = f"Financial Flow Analysis - {income_source_label} ({date_range})<br><sub>Total Revenue: ${total_revenue:,.0f} | Total Expenses: ${total_expenses:,.0f} | Net Income: ${adjusted_gross_income:,.0f}</sub>"
+    title_text = _sankey_title_text(income_sources, start_date, end_date,
+                                    total_revenue, total_expenses, adjusted_gross_income)
     
     # Calculate dynamic height based on number of nodes (use node_labels length)
     num_nodes = len(node_labels)
     # Dynamic height: min 500px, max 1500px, 30px per node (more compact)
     dynamic_height = max(500, min(1500, 200 + (num_nodes * 30)))
     
-    fig.update_layout(
-        title_text=title_text,
-        font_size=10,  # Smaller font size for better readability and compact display
-        height=dynamic_height,   # Dynamic height to accommodate all categories (Option C)
-        width=None,   # Let it be responsive to container width
-        margin=dict(l=60, r=60, t=100, b=60),  # Reduced margins for more diagram space
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        title_x=0.5,  # Center the title
-        title_font_size=20,
-        # Enable zooming and panning
-        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        # Make it responsive
-        autosize=True,  # Enable responsive sizing
-        # Enable zoom and pan
-        dragmode='zoom',
-        # Add zoom controls
-        showlegend=False
-    )
-    
-    # Add zoom and pan controls
-    fig.update_layout(
-        # Enable zoom and pan
-        dragmode='zoom',
-        # Add selection mode
-        selectdirection='d',  # 'd' for diagonal selection
-        # Enable hover
-        hovermode='closest'
-    )
-    
     # Add dollar scale to the Total Revenue (blue) node
     # Calculate 10 intervals from $0 (top) to total_revenue (bottom)
     scale_intervals = 10
@@ -476,30 +571,35 @@ def create_enhanced_sankey_diagram(financial_data, start_date=None, end_date=Non
                 yref="paper",  # Use paper coordinates (0-1)
                 xanchor="center",  # Center text on the blue line
                 yanchor="middle",
-                font=dict(size=9, color="#3498db"),  # Blue color to match Total Revenue node
+                font=dict(size=9, color=_TOTAL_REVENUE_COLOR),  # Match the Total Revenue node
                 bgcolor="rgba(255, 255, 255, 0.8)",  # Semi-transparent white background
-                bordercolor="#3498db",
+                bordercolor=_TOTAL_REVENUE_COLOR,
                 borderwidth=1,
                 borderpad=3
             )
         )
     
-    # Add all scale annotations to the figure
-    fig.update_layout(annotations=scale_annotations)
-    
-    return fig
+    # Build the figure with its layout and all scale annotations in one go
+    # (width is left unset so it is responsive to container width)
+    return _sankey_figure(sankey, _sankey_layout(
+        title_text,
+        font_size=10,  # Smaller font size for better readability and compact display
+        height=dynamic_height,   # Dynamic height to accommodate all categories (Option C)
+        margin=dict(l=60, r=60, t=100, b=60),  # Reduced margins for more diagram space
+        annotations=scale_annotations
+    ))
 
 def create_sample_sankey_diagram(start_date=None, end_date=None):
     """Create a sample Sankey diagram for demonstration with enhanced features"""
-    from datetime import datetime, timedelta
-    
     # Set default date range (Year to Date if not provided)
-    if end_date is None:
-        end_date = datetime.now()
-    if start_date is None:
-        # Year to Date (January 1st of current year)
-        start_date = datetime(end_date.year, 1, 1)
+    start_date, end_date = _default_date_range(start_date, end_date)
     
+    # The sample data is fixed, so only the displayed date range distinguishes figures
+    key = ('sample', start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+    return _cached_figure(key, lambda: _build_sample_sankey_diagram(start_date, end_date))
+
+def _build_sample_sankey_diagram(start_date, end_date):
+    """Build the sample Sankey figure for create_sample_sankey_diagram"""
     # Sample financial data
     income_sources = {
         "Product Sales": 45000,
@@ -514,52 +614,39 @@ def create_sample_sankey_diagram(start_date=None, end_date=None):
         "Administrative": 8000
     }
     
-    # Calculate totals
-    total_revenue = sum(income_sources.values())
-    total_expenses = sum(expense_categories.values())
+    # Calculate totals along with each side's node labels and link values
+    income_labels, income_values, total_revenue = _labelled_amounts(income_sources.items())
+    expense_labels, expense_values, total_expenses = _labelled_amounts(expense_categories.items())
     adjusted_gross_income = total_revenue - total_expenses
     
-    # Create nodes with dollar amounts as labels
-    node_labels = []
-    node_colors = []
-    
-    # Income sources (left column)
-    for source, amount in income_sources.items():
-        node_labels.append(f"{source}<br>${amount:,.0f}")
-        node_colors.append("#27ae60")  # Green for income
+    # Create nodes with dollar amounts as labels, income sources (left column) first
+    node_labels = income_labels
+    node_colors = [_INCOME_COLOR] * len(income_labels)
     
     # Total revenue (center column) with Net Income
     net_income_text = f"<br><br>Net Income: ${adjusted_gross_income:,.0f}" if adjusted_gross_income != 0 else ""
     node_labels.append(f"Total Revenue<br>${total_revenue:,.0f}{net_income_text}")
-    node_colors.append("#3498db")  # Blue for total revenue
+    node_colors.append(_TOTAL_REVENUE_COLOR)
     
     # Expense categories (right column)
-    for expense, amount in expense_categories.items():
-        node_labels.append(f"{expense}<br>${amount:,.0f}")
-        node_colors.append("#e74c3c")  # Red for expenses
+    node_labels.extend(expense_labels)
+    node_colors.extend([_EXPENSE_COLOR] * len(expense_labels))
     
     # Adjusted gross income
     node_labels.append(f"Net Income<br>${adjusted_gross_income:,.0f}")
-    node_colors.append("#f39c12")  # Gold for final result
-    
-    # Create links
-    source_indices = []
-    target_indices = []
-    values = []
+    node_colors.append(_NET_INCOME_COLOR)
     
-    # Links from income sources to total revenue
-    total_revenue_idx = len(income_sources)
-    for i, (source, amount) in enumerate(income_sources.items()):
-        source_indices.append(i)
-        target_indices.append(total_revenue_idx)
-        values.append(amount)
+    # Create links, starting with income sources to total revenue
+    total_revenue_idx = len(income_values)
+    source_indices = list(range(total_revenue_idx))
+    target_indices = [total_revenue_idx] * total_revenue_idx
+    values = income_values
     
     # Links from total revenue to expense categories
     expense_start_idx = total_revenue_idx + 1
-    for i, (expense, amount) in enumerate(expense_categories.items()):
-        source_indices.append(total_revenue_idx)
-        target_indices.append(expense_start_idx + i)
-        values.append(amount)
+    source_indices.extend([total_revenue_idx] * len(expense_values))
+    target_indices.extend(range(expense_start_idx, expense_start_idx + len(expense_values)))
+    values.extend(expense_values)
     
     # Link from total revenue to adjusted gross income
     adjusted_gross_idx = len(node_labels) - 1
@@ -567,16 +654,16 @@ def create_sample_sankey_diagram(start_date=None, end_date=None):
     target_indices.append(adjusted_gross_idx)
     values.append(adjusted_gross_income)
     
-    # Create the enhanced Sankey diagram
-    fig = go.Figure(data=[go.Sankey(
+    # Create the sample Sankey trace (y is left unset so nodes auto-arrange vertically)
+    sankey = dict(
+        type = 'sankey',
         node = dict(
             pad = 25,  # Reduced padding for tighter layout
             thickness = 22,  # Slightly thinner nodes for better fit
             line = dict(color = "black", width = 1),
             label = node_labels,
             color = node_colors,
-            x = [0.15, 0.5, 0.85],  # More centered positioning for responsive layout
-            y = None  # Auto-arrange vertically
+            x = [0.15, 0.5, 0.85]  # More centered positioning for responsive layout
         ),
         link = dict(
             source = source_indices,
@@ -584,50 +671,20 @@ def create_sample_sankey_diagram(start_date=None, end_date=None):
             value = values,
             color = "rgba(0,0,0,0.2)"  # Subtle link colors
         )
-    )])
-    
-    # Format date range
-    date_range = f"{start_date.strftime('%B %d, %Y')} - {end_date.strftime('%B %d, %Y')}"
+    )
     
     # Add title with financial summary and date range
-    # Check if income is by project or by account
-    income_source_label = "Project Revenue" if len(income_sources) > 0 else "Account Revenue"
-    
-    title_text = f"Financial Flow Analysis - {income_source_label} ({date_range})<br><sub>Total Revenue: ${total_revenue:,.0f} | Total Expenses: ${total_expenses:,.0f} | Net Income: ${adjusted_gross_income:,.0f}</sub>"
+    title_text = _sankey_title_text(income_sources, start_date, end_date,
+                                    total_revenue, total_expenses, adjusted_gross_income)
     
     # Calculate dynamic height based on number of categories
     num_categories = len(income_sources) + len(expense_categories) + 2  # +2 for total revenue and adjusted gross
     # Much more generous height calculation - 80px per category with better min/max
     dynamic_height = max(800, min(2000, 300 + (num_categories * 80)))  # Min 800, max 2000, 80px per category
     
-    fig.update_layout(
-        title_text=title_text,
+    return _sankey_figure(sankey, _sankey_layout(
+        title_text,
         font_size=18,  # Larger font for better readability
         height=dynamic_height,  # Dynamic height based on content
-        margin=dict(l=80, r=80, t=120, b=80),  # More margin space
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        title_x=0.5,  # Center the title
-        title_font_size=20,
-        # Enable zooming and panning
-        xaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        yaxis=dict(showgrid=False, zeroline=False, showticklabels=False),
-        # Make it responsive
-        autosize=True,
-        # Enable zoom and pan
-        dragmode='zoom',
-        # Add zoom controls
-        showlegend=False
-    )
-    
-    # Add zoom and pan controls
-    fig.update_layout(
-        # Enable zoom and pan
-        dragmode='zoom',
-        # Add selection mode
-        selectdirection='d',  # 'd' for diagonal selection
-        # Enable hover
-        hovermode='closest'
-    )
-    
-    return fig
+        margin=dict(l=80, r=80, t=120, b=80)  # More margin space
+    ))